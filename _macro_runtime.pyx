@@ -0,0 +1,93 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+# distutils: libraries = user32 kernel32
+"""
+マクロ実行ループの Cython 版（Windows 専用・任意）。
+
+macro_toggle.MacroTool._run から呼ばれる。命令は macro_toggle.op_record() が作る
+(kind, a, b) のタプルで、SendInput と wait は GIL を外して直接 Win32 API を呼ぶ。
+それ以外（pydirectinput / 押しっぱなし管理など）は Python の op をそのまま呼ぶ。
+
+ビルド:
+    py -m pip install cython
+    cythonize -i _macro_runtime.pyx
+"""
+from libc.stdint cimport uintptr_t
+from libc.stdlib cimport free, malloc
+
+
+cdef extern from "windows.h":
+    ctypedef void* HANDLE
+    ctypedef unsigned long DWORD
+    ctypedef unsigned int UINT
+
+    ctypedef struct INPUT:
+        pass
+
+    UINT SendInput(UINT cInputs, INPUT* pInputs, int cbSize) nogil
+    DWORD WaitForSingleObject(HANDLE hHandle, DWORD dwMilliseconds) nogil
+
+
+# macro_toggle.OP_* と揃えること
+cdef enum:
+    OP_CALL = 0
+    OP_SEND = 1
+    OP_WAIT = 2
+
+
+cdef struct Op:
+    int kind
+    void* payload  # OP_CALL: Python の op（借用参照） / OP_SEND: INPUT 配列
+    DWORD count    # OP_SEND: INPUT の個数 / OP_WAIT: ミリ秒
+
+
+def run(list records, bint loop, list stop_flag, size_t stop_handle, object ev, object hold):
+    """
+    records を先頭から実行する（loop なら stop_flag[0] が立つまで繰り返す）。
+    records は実行中ずっと保持されている前提（OP_CALL の op と OP_SEND の配列を借用するため）。
+    """
+    cdef Py_ssize_t n = len(records)
+    cdef Py_ssize_t i
+    cdef Op* ops
+    cdef Op* op
+    cdef HANDLE h = <HANDLE>stop_handle
+    cdef int size = sizeof(INPUT)
+
+    if n == 0:
+        return
+
+    ops = <Op*>malloc(n * sizeof(Op))
+    if ops == NULL:
+        raise MemoryError()
+
+    try:
+        for i in range(n):
+            kind, a, b = records[i]
+            ops[i].kind = kind
+            ops[i].count = b
+            if kind == OP_CALL:
+                ops[i].payload = <void*>a
+            elif kind == OP_SEND:
+                ops[i].payload = <void*><uintptr_t>a
+            elif kind == OP_WAIT:
+                ops[i].payload = NULL
+                ops[i].count = a
+            else:
+                raise ValueError(f"不明な命令: {kind}")
+
+        while True:
+            for i in range(n):
+                if stop_flag[0]:
+                    return
+                op = &ops[i]
+                if op.kind == OP_SEND:
+                    with nogil:
+                        SendInput(op.count, <INPUT*>op.payload, size)
+                elif op.kind == OP_WAIT:
+                    with nogil:
+                        WaitForSingleObject(h, op.count)
+                else:
+                    (<object>op.payload)(ev, hold)
+            if not loop or stop_flag[0]:
+                return
+    finally:
+        free(ops)
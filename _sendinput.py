@@ -0,0 +1,159 @@
+"""
+Windows の SendInput を ctypes で直接呼ぶための薄いラッパ。
+
+pydirectinput は 1 回の入力ごとに引数チェックや INPUT 構造体の組み立てを行うため、
+マクロ側では INPUT をコンパイル時に作っておき、実行時は SendInput を呼ぶだけにする。
+Windows 以外では AVAILABLE = False（SendInput は None）。
+"""
+from __future__ import annotations
+
+import ctypes
+import sys
+from ctypes import wintypes
+from typing import Dict, Optional, Sequence, Tuple
+
+INPUT_MOUSE = 0
+INPUT_KEYBOARD = 1
+
+KEYEVENTF_EXTENDEDKEY = 0x0001
+KEYEVENTF_KEYUP = 0x0002
+KEYEVENTF_SCANCODE = 0x0008
+
+MOUSEEVENTF_LEFTDOWN = 0x0002
+MOUSEEVENTF_LEFTUP = 0x0004
+MOUSEEVENTF_RIGHTDOWN = 0x0008
+MOUSEEVENTF_RIGHTUP = 0x0010
+MOUSEEVENTF_MIDDLEDOWN = 0x0020
+MOUSEEVENTF_MIDDLEUP = 0x0040
+
+# button -> (down, up)
+MOUSE_BUTTON_FLAGS: Dict[str, Tuple[int, int]] = {
+    "left": (MOUSEEVENTF_LEFTDOWN, MOUSEEVENTF_LEFTUP),
+    "right": (MOUSEEVENTF_RIGHTDOWN, MOUSEEVENTF_RIGHTUP),
+    "middle": (MOUSEEVENTF_MIDDLEDOWN, MOUSEEVENTF_MIDDLEUP),
+}
+
+ULONG_PTR = ctypes.c_size_t
+
+
+class KEYBDINPUT(ctypes.Structure):
+    _fields_ = [
+        ("wVk", wintypes.WORD),
+        ("wScan", wintypes.WORD),
+        ("dwFlags", wintypes.DWORD),
+        ("time", wintypes.DWORD),
+        ("dwExtraInfo", ULONG_PTR),
+    ]
+
+
+class MOUSEINPUT(ctypes.Structure):
+    _fields_ = [
+        ("dx", wintypes.LONG),
+        ("dy", wintypes.LONG),
+        ("mouseData", wintypes.DWORD),
+        ("dwFlags", wintypes.DWORD),
+        ("time", wintypes.DWORD),
+        ("dwExtraInfo", ULONG_PTR),
+    ]
+
+
+class HARDWAREINPUT(ctypes.Structure):
+    _fields_ = [
+        ("uMsg", wintypes.DWORD),
+        ("wParamL", wintypes.WORD),
+        ("wParamH", wintypes.WORD),
+    ]
+
+
+class _INPUTUNION(ctypes.Union):
+    _fields_ = [("mi", MOUSEINPUT), ("ki", KEYBDINPUT), ("hi", HARDWAREINPUT)]
+
+
+class INPUT(ctypes.Structure):
+    _anonymous_ = ("u",)
+    _fields_ = [("type", wintypes.DWORD), ("u", _INPUTUNION)]
+
+
+INPUT_SIZE = ctypes.sizeof(INPUT)
+
+AVAILABLE = sys.platform.startswith("win")
+
+if AVAILABLE:
+    _user32 = ctypes.WinDLL("user32", use_last_error=True)
+
+    SendInput = _user32.SendInput
+    SendInput.argtypes = (wintypes.UINT, ctypes.POINTER(INPUT), ctypes.c_int)
+    SendInput.restype = wintypes.UINT
+
+    _VkKeyScanW = _user32.VkKeyScanW
+    _VkKeyScanW.argtypes = (wintypes.WCHAR,)
+    _VkKeyScanW.restype = ctypes.c_short
+
+    _MapVirtualKeyW = _user32.MapVirtualKeyW
+    _MapVirtualKeyW.argtypes = (wintypes.UINT, wintypes.UINT)
+    _MapVirtualKeyW.restype = wintypes.UINT
+else:
+    SendInput = None
+
+MAPVK_VK_TO_VSC = 0
+
+# pydirectinput のキー名 -> (スキャンコード, 追加フラグ)
+SCAN_CODES: Dict[str, Tuple[int, int]] = {
+    "esc": (0x01, 0),
+    "backspace": (0x0E, 0),
+    "tab": (0x0F, 0),
+    "enter": (0x1C, 0),
+    "ctrl": (0x1D, 0),
+    "shift": (0x2A, 0),
+    "alt": (0x38, 0),
+    "space": (0x39, 0),
+    "home": (0x47, KEYEVENTF_EXTENDEDKEY),
+    "up": (0x48, KEYEVENTF_EXTENDEDKEY),
+    "pageup": (0x49, KEYEVENTF_EXTENDEDKEY),
+    "left": (0x4B, KEYEVENTF_EXTENDEDKEY),
+    "right": (0x4D, KEYEVENTF_EXTENDEDKEY),
+    "end": (0x4F, KEYEVENTF_EXTENDEDKEY),
+    "down": (0x50, KEYEVENTF_EXTENDEDKEY),
+    "pagedown": (0x51, KEYEVENTF_EXTENDEDKEY),
+    "delete": (0x53, KEYEVENTF_EXTENDEDKEY),
+    "f11": (0x57, 0),
+    "f12": (0x58, 0),
+}
+for _i in range(1, 11):
+    SCAN_CODES[f"f{_i}"] = (0x3A + _i, 0)
+
+
+def scan_code(pdi_key: str) -> Optional[Tuple[int, int]]:
+    """
+    pydirectinput のキー名をスキャンコードに変換する。
+    変換できない（Shift 等が必要な文字や未対応のキー）場合は None。
+    """
+    sc = SCAN_CODES.get(pdi_key)
+    if sc is not None or not AVAILABLE or len(pdi_key) != 1:
+        return sc
+    r = _VkKeyScanW(pdi_key)
+    if r == -1 or (r >> 8) & 0xFF:
+        return None
+    scan = _MapVirtualKeyW(r & 0xFF, MAPVK_VK_TO_VSC)
+    if not scan:
+        return None
+    return (scan, 0)
+
+
+def key_input(scan: int, flags: int) -> INPUT:
+    inp = INPUT(type=INPUT_KEYBOARD)
+    inp.ki.wScan = scan
+    inp.ki.dwFlags = KEYEVENTF_SCANCODE | flags
+    return inp
+
+
+def mouse_input(flags: int, data: int = 0) -> INPUT:
+    inp = INPUT(type=INPUT_MOUSE)
+    inp.mi.dwFlags = flags
+    inp.mi.mouseData = data
+    return inp
+
+
+def pack(inputs: Sequence[INPUT]) -> ctypes.Array:
+    """SendInput にそのまま渡せる INPUT 配列を作る。"""
+    return (INPUT * len(inputs))(*inputs)
@@ -0,0 +1,152 @@
+"""
+Win32 の RegisterHotKey でホットキーを受け取るための薄いラッパ。
+
+pynput の GlobalHotKeys は低レベルキーボードフック（WH_KEYBOARD_LL）で全キー入力を
+Python 側に渡して判定するため、どのアプリでキーを押しても本プロセスを経由する。
+RegisterHotKey なら判定は OS 側で行われ、該当ホットキーのときだけ WM_HOTKEY が届く。
+Windows 以外では AVAILABLE = False。
+"""
+from __future__ import annotations
+
+import ctypes
+import sys
+from ctypes import wintypes
+from typing import Callable, Dict, List, Optional, Tuple
+
+AVAILABLE = sys.platform.startswith("win")
+
+MOD_ALT = 0x0001
+MOD_CONTROL = 0x0002
+MOD_SHIFT = 0x0004
+MOD_WIN = 0x0008
+MOD_NOREPEAT = 0x4000
+
+WM_HOTKEY = 0x0312
+WM_QUIT = 0x0012
+
+MODIFIERS: Dict[str, int] = {
+    "<ctrl>": MOD_CONTROL,
+    "<shift>": MOD_SHIFT,
+    "<alt>": MOD_ALT,
+    "<cmd>": MOD_WIN,
+}
+
+# pynput のホットキー表記 -> 仮想キーコード
+NAMED_VKS: Dict[str, int] = {
+    "<backspace>": 0x08,
+    "<tab>": 0x09,
+    "<enter>": 0x0D,
+    "<pause>": 0x13,
+    "<esc>": 0x1B,
+    "<space>": 0x20,
+    "<page_up>": 0x21,
+    "<page_down>": 0x22,
+    "<end>": 0x23,
+    "<home>": 0x24,
+    "<left>": 0x25,
+    "<up>": 0x26,
+    "<right>": 0x27,
+    "<down>": 0x28,
+    "<insert>": 0x2D,
+    "<delete>": 0x2E,
+}
+for _i in range(1, 25):
+    NAMED_VKS[f"<f{_i}>"] = 0x6F + _i
+
+if AVAILABLE:
+    _user32 = ctypes.WinDLL("user32", use_last_error=True)
+    _kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+
+    _RegisterHotKey = _user32.RegisterHotKey
+    _RegisterHotKey.argtypes = (wintypes.HWND, ctypes.c_int, wintypes.UINT, wintypes.UINT)
+    _RegisterHotKey.restype = wintypes.BOOL
+
+    _UnregisterHotKey = _user32.UnregisterHotKey
+    _UnregisterHotKey.argtypes = (wintypes.HWND, ctypes.c_int)
+    _UnregisterHotKey.restype = wintypes.BOOL
+
+    _GetMessageW = _user32.GetMessageW
+    _GetMessageW.argtypes = (ctypes.POINTER(wintypes.MSG), wintypes.HWND, wintypes.UINT, wintypes.UINT)
+    _GetMessageW.restype = wintypes.BOOL
+
+    _PostThreadMessageW = _user32.PostThreadMessageW
+    _PostThreadMessageW.argtypes = (wintypes.DWORD, wintypes.UINT, wintypes.WPARAM, wintypes.LPARAM)
+    _PostThreadMessageW.restype = wintypes.BOOL
+
+    _VkKeyScanW = _user32.VkKeyScanW
+    _VkKeyScanW.argtypes = (wintypes.WCHAR,)
+    _VkKeyScanW.restype = ctypes.c_short
+
+    _GetCurrentThreadId = _kernel32.GetCurrentThreadId
+    _GetCurrentThreadId.argtypes = ()
+    _GetCurrentThreadId.restype = wintypes.DWORD
+
+
+def parse_hotkey(s: str) -> Optional[Tuple[int, int]]:
+    """
+    "<ctrl>+<shift>+m" のような pynput 形式を (修飾キーフラグ, 仮想キーコード) に変換する。
+    RegisterHotKey で表せない指定（左右の区別、修飾キー以外が複数、Shift 等が必要な文字など）は None。
+    """
+    mods = 0
+    vk: Optional[int] = None
+    for part in s.strip().lower().split("+"):
+        if part in MODIFIERS:
+            mods |= MODIFIERS[part]
+            continue
+        if vk is not None:
+            return None
+        if part in NAMED_VKS:
+            vk = NAMED_VKS[part]
+        elif len(part) == 1 and AVAILABLE:
+            r = _VkKeyScanW(part)
+            # Shift 等が必要な文字（"!" など）は仮想キーだけでは表せない
+            if r == -1 or (r >> 8) & 0xFF:
+                return None
+            vk = r & 0xFF
+        else:
+            return None
+    if vk is None:
+        return None
+    return (mods, vk)
+
+
+class HotKeyLoop:
+    """
+    RegisterHotKey で登録したホットキーを GetMessageW のループで待ち受ける。
+    登録と run() は同じスレッドで呼ぶこと（ホットキーは登録したスレッドに届く）。
+    """
+    def __init__(self) -> None:
+        self._callbacks: List[Callable[[], None]] = []
+        self._thread_id = 0
+
+    def register_all(self, bindings: List[Tuple[str, Callable[[], None]]]) -> bool:
+        """全部登録できたら True。1 つでも失敗したら登録済みの分も解除して False。"""
+        if not AVAILABLE:
+            return False
+        self._thread_id = _GetCurrentThreadId()
+        for hotkey, cb in bindings:
+            parsed = parse_hotkey(hotkey)
+            hid = len(self._callbacks) + 1
+            if parsed is None or not _RegisterHotKey(None, hid, parsed[0] | MOD_NOREPEAT, parsed[1]):
+                self.unregister_all()
+                return False
+            self._callbacks.append(cb)
+        return True
+
+    def unregister_all(self) -> None:
+        for i in range(len(self._callbacks)):
+            _UnregisterHotKey(None, i + 1)
+        self._callbacks.clear()
+
+    def run(self) -> None:
+        msg = wintypes.MSG()
+        try:
+            while _GetMessageW(ctypes.byref(msg), None, 0, 0) > 0:
+                if msg.message == WM_HOTKEY and 1 <= msg.wParam <= len(self._callbacks):
+                    self._callbacks[msg.wParam - 1]()
+        finally:
+            self.unregister_all()
+
+    def stop(self) -> None:
+        # 別スレッドからでも呼べる（WM_QUIT を送って GetMessageW のループを抜ける）
+        _PostThreadMessageW(self._thread_id, WM_QUIT, 0, 0)
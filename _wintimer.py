@@ -0,0 +1,72 @@
+"""
+Windows のタイマ分解能と待機用イベントを扱う薄いラッパ。
+
+既定のタイマ分解能は約 15.6ms のため、wait に 1ms を指定しても 15ms 程度眠ってしまう。
+timeBeginPeriod(1) で分解能を上げ、停止通知は Win32 イベントを WaitForSingleObject で
+直接待つ（threading の Python 層を通らない）。
+Windows 以外では AVAILABLE = False で、各関数は何もしない。
+"""
+from __future__ import annotations
+
+import ctypes
+import sys
+from ctypes import wintypes
+from typing import Optional
+
+AVAILABLE = sys.platform.startswith("win")
+
+TIMER_PERIOD_MS = 1
+WAIT_OBJECT_0 = 0
+INFINITE = 0xFFFFFFFF
+
+if AVAILABLE:
+    _winmm = ctypes.WinDLL("winmm")
+    _kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+
+    _timeBeginPeriod = _winmm.timeBeginPeriod
+    _timeBeginPeriod.argtypes = (wintypes.UINT,)
+    _timeBeginPeriod.restype = wintypes.UINT
+
+    _timeEndPeriod = _winmm.timeEndPeriod
+    _timeEndPeriod.argtypes = (wintypes.UINT,)
+    _timeEndPeriod.restype = wintypes.UINT
+
+    _CreateEventW = _kernel32.CreateEventW
+    _CreateEventW.argtypes = (wintypes.LPVOID, wintypes.BOOL, wintypes.BOOL, wintypes.LPCWSTR)
+    _CreateEventW.restype = wintypes.HANDLE
+
+    SetEvent = _kernel32.SetEvent
+    SetEvent.argtypes = (wintypes.HANDLE,)
+    SetEvent.restype = wintypes.BOOL
+
+    ResetEvent = _kernel32.ResetEvent
+    ResetEvent.argtypes = (wintypes.HANDLE,)
+    ResetEvent.restype = wintypes.BOOL
+
+    WaitForSingleObject = _kernel32.WaitForSingleObject
+    WaitForSingleObject.argtypes = (wintypes.HANDLE, wintypes.DWORD)
+    WaitForSingleObject.restype = wintypes.DWORD
+
+
+def begin_period() -> None:
+    if AVAILABLE:
+        _timeBeginPeriod(TIMER_PERIOD_MS)
+
+
+def end_period() -> None:
+    if AVAILABLE:
+        _timeEndPeriod(TIMER_PERIOD_MS)
+
+
+def create_stop_event() -> Optional[int]:
+    """
+    停止通知用の手動リセットイベントを作る（Windows 以外は None）。
+    自動リセットだと 1 回の wait で非シグナルに戻り、後続の wait が止まらなくなるため手動リセット。
+    """
+    if not AVAILABLE:
+        return None
+    return _CreateEventW(None, True, False, None) or None
+
+
+def to_wait_ms(seconds: float) -> int:
+    return min(INFINITE - 1, max(0, round(seconds * 1000)))
@@ -1,16 +1,39 @@
 from __future__ import annotations
 
+import ctypes
 import json
+import pickle
 import sys
 import threading
+import time
+from functools import partial
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple, Union
 
 from pynput import keyboard, mouse
 from pynput.keyboard import Key, KeyCode, Controller as KeyboardController
 from pynput.mouse import Button, Controller as MouseController
 
+import _sendinput as SI
+import _winhotkey as HK
+import _wintimer as WT
+
+# --- Cython 版の実行ループ（ビルドしてあれば使う。Windows 専用） ---
+try:
+    import _macro_runtime as RT  # type: ignore
+except Exception:
+    RT = None
+
 CONFIG_PATH = Path(__file__).with_name("macros.json")
+# 解析・検証済みの設定を (mtime, size) 付きで保存しておくキャッシュ
+CONFIG_CACHE_PATH = CONFIG_PATH.with_name("macros.cache.pkl")
+CONFIG_CACHE_VERSION = 2
+
+# --- orjson（あれば JSON 解析を高速化） ---
+try:
+    import orjson  # type: ignore
+except Exception:
+    orjson = None
 
 # --- pydirectinput（Windowsゲーム向け） ---
 try:
@@ -20,21 +43,138 @@ except Exception:
 
 USE_PDI = sys.platform.startswith("win") and (PDI is not None)
 
+# SendInput 直呼び（pydirectinput を経由しない高速経路）
+USE_SENDINPUT = USE_PDI and SI.AVAILABLE
+
 K = KeyboardController()     # fallback
 M = MouseController()        # fallback
 
 KeyLike = Union[Key, KeyCode]
 
+# これより短い wait は OS の待機を使わずビジーループで待つ
+SPIN_WAIT_SECONDS = 0.002
+
+# _macro_runtime に渡す命令の種類（_macro_runtime.pyx と揃えること）
+OP_CALL = 0  # (OP_CALL, op, 0): Python の op を呼ぶ
+OP_SEND = 1  # (OP_SEND, INPUT 配列のアドレス, 個数): SendInput
+OP_WAIT = 2  # (OP_WAIT, ミリ秒, 0): 停止イベントを待つ
+
+
+def _parse_config(raw: bytes) -> Dict[str, Any]:
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw.decode("utf-8"))
+
 
 def load_config() -> Dict[str, Any]:
-    data = json.loads(CONFIG_PATH.read_text(encoding="utf-8"))
+    st = CONFIG_PATH.stat()
+    stamp = (CONFIG_CACHE_VERSION, st.st_mtime_ns, st.st_size)
+
+    # macros.json が前回から変わっていなければキャッシュをそのまま使う
+    try:
+        with CONFIG_CACHE_PATH.open("rb") as f:
+            if pickle.load(f) == stamp:
+                return pickle.load(f)
+    except Exception:
+        pass
+
+    data = _parse_config(CONFIG_PATH.read_bytes())
     if not data.get("trigger_hotkey") and not data.get("trigger_key"):
         raise ValueError('macros.json に "trigger_hotkey" か "trigger_key" が必要です。')
-    if "macro" not in data:
-        raise ValueError('macros.json に "macro" が必要です。')
+    if not isinstance(data.get("macro"), list):
+        raise ValueError('macros.json に "macro"（配列）が必要です。')
+    data["macro"] = [normalize_step(i, step) for i, step in enumerate(data["macro"])]
+
+    # 単キー指定は pynput のキーに変換した結果も持っておく
+    for name in ("trigger_key", "quit_key"):
+        data[f"_{name}"] = parse_key_pynput(str(data[name])) if data.get(name) else None
+
+    try:
+        tmp = CONFIG_CACHE_PATH.with_suffix(".tmp")
+        with tmp.open("wb") as f:
+            pickle.dump(stamp, f)
+            pickle.dump(data, f)
+        tmp.replace(CONFIG_CACHE_PATH)
+    except Exception:
+        pass
     return data
 
 
+ACTIONS = ("tap", "press", "release")
+MOVE_MODES = ("relative", "absolute")
+BUTTONS = ("left", "right", "middle")
+
+
+def _choice(i: int, step: Dict[str, Any], field: str, default: str, choices: Tuple[str, ...]) -> str:
+    v = str(step.get(field, default)).strip().lower()
+    if v not in choices:
+        allowed = "/".join(f'"{c}"' for c in choices)
+        raise ValueError(f'macro[{i}]: {step.get("type")}.{field} は {allowed} のみ: {v}')
+    return v
+
+
+def _key_name(i: int, raw: Any) -> str:
+    k = str(raw).strip()
+    if len(k) != 1 and not k.startswith("Key."):
+        raise ValueError(f"macro[{i}]: キー指定は 'Key.xxx' か 1文字のみ対応です: {k}")
+    return k
+
+
+def _number(i: int, step: Dict[str, Any], field: str, default: Any, conv: Callable[[Any], Any]) -> Any:
+    try:
+        return conv(step.get(field, default))
+    except (TypeError, ValueError) as e:
+        raise ValueError(f'macro[{i}]: {step.get("type")}.{field} は数値で指定してください: {step.get(field)}') from e
+
+
+def normalize_step(i: int, step: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    step を型・既定値を埋めた正規形に変換する（load_config で行い、結果はキャッシュされる）。
+    正規化済みの step に対して呼んでも同じ結果になる。
+    コンパイル時は str()/int() をせず、そのまま step["x"] などを参照できる。
+    """
+    if not isinstance(step, dict):
+        raise ValueError(f"macro[{i}]: step はオブジェクトで指定してください")
+    t = step.get("type")
+
+    if t == "wait":
+        return {"type": t, "seconds": max(0.0, _number(i, step, "seconds", 0, float))}
+    if t == "text":
+        return {"type": t, "text": str(step.get("text", ""))}
+    if t == "key":
+        if "key" not in step:
+            raise ValueError(f'macro[{i}]: key に "key" が必要です')
+        return {
+            "type": t,
+            "key": _key_name(i, step["key"]),
+            "action": _choice(i, step, "action", "tap", ACTIONS),
+        }
+    if t == "combo":
+        return {"type": t, "keys": [_key_name(i, k) for k in step.get("keys", [])]}
+    if t == "mouse_click":
+        return {
+            "type": t,
+            "button": _choice(i, step, "button", "left", BUTTONS),
+            "count": max(1, _number(i, step, "count", 1, int)),
+        }
+    if t == "mouse_button":
+        return {
+            "type": t,
+            "button": _choice(i, step, "button", "left", BUTTONS),
+            "action": _choice(i, step, "action", "tap", ACTIONS),
+        }
+    if t == "mouse_move":
+        return {
+            "type": t,
+            "mode": _choice(i, step, "mode", "relative", MOVE_MODES),
+            "x": _number(i, step, "x", 0, int),
+            "y": _number(i, step, "y", 0, int),
+        }
+    if t == "mouse_scroll":
+        return {"type": t, "dx": _number(i, step, "dx", 0, int), "dy": _number(i, step, "dy", 0, int)}
+    raise ValueError(f"macro[{i}]: 不明な step.type: {t}")
+
+
 def parse_key_pynput(s: str) -> KeyLike:
     s = s.strip()
     if s.startswith("Key."):
@@ -48,12 +188,17 @@ def parse_key_pynput(s: str) -> KeyLike:
     raise ValueError(f"キー指定は 'Key.xxx' か 1文字のみ対応です: {s}")
 
 
-def key_matches(event_key: KeyLike, target: KeyLike) -> bool:
-    if isinstance(event_key, Key) and isinstance(target, Key):
-        return event_key == target
-    if isinstance(event_key, KeyCode) and isinstance(target, KeyCode):
-        return event_key == target
-    return False
+def key_id(k: Optional[KeyLike]) -> Tuple[int, Any]:
+    # 比較用の ID。Key は (0, Key)、文字キーは (1, char)、文字のないキーは (2, vk)
+    if type(k) is Key:
+        return (0, k)
+    char = getattr(k, "char", None)
+    return (1, char) if char is not None else (2, getattr(k, "vk", None))
+
+
+def parse_hotkey_ids(s: str) -> FrozenSet[Tuple[int, Any]]:
+    # "<ctrl>+<shift>+m" -> そのホットキーを構成するキーの key_id() の集合
+    return frozenset(key_id(k) for k in keyboard.HotKey.parse(s))
 
 
 # ---- pydirectinput 用キー名変換 ----
@@ -81,16 +226,32 @@ PDI_KEY_MAP: Dict[str, str] = {
     "Key.alt": "alt",
     "Key.alt_l": "alt",
     "Key.alt_r": "alt",
+    "Key.alt_gr": "altright",
+    "Key.cmd": "win",
+    "Key.cmd_l": "winleft",
+    "Key.cmd_r": "winright",
+    "Key.menu": "apps",
+    "Key.caps_lock": "capslock",
+    "Key.num_lock": "numlock",
+    "Key.scroll_lock": "scrolllock",
+    "Key.print_screen": "printscreen",
+    "Key.insert": "insert",
+    "Key.pause": "pause",
 }
-for i in range(1, 25):
+# pydirectinput が対応しているのは f1〜f12 まで（メディアキーも非対応）
+for i in range(1, 13):
     PDI_KEY_MAP[f"Key.f{i}"] = f"f{i}"
 
 
 def to_pdi_key(raw: str) -> str:
+    # コンパイル時に 1 回だけ呼ぶ（実行時は変換済みの値を使う）
     raw = raw.strip()
     if len(raw) == 1:
         return raw
-    return PDI_KEY_MAP.get(raw, raw.replace("Key.", ""))
+    try:
+        return PDI_KEY_MAP[raw]
+    except KeyError as e:
+        raise ValueError(f"不明なキー名: {raw}") from e
 
 
 def to_pdi_button(btn: str) -> str:
@@ -100,194 +261,464 @@ def to_pdi_button(btn: str) -> str:
     raise ValueError('button は "left"/"right"/"middle" のみ対応です')
 
 
+PYNPUT_BUTTON_MAP: Dict[str, Button] = {
+    "left": Button.left,
+    "right": Button.right,
+    "middle": Button.middle,
+}
+
+
+def to_pynput_button(btn: str) -> Button:
+    return PYNPUT_BUTTON_MAP[to_pdi_button(btn)]
+
+
+class FastEvent(threading.Event):
+    """
+    停止フラグ用の Event。is_set() をロックなしで読めるようにし、
+    同じ状態を view（長さ 1 のリスト）にも反映する（実行ループは view[0] を読む）。
+    フラグは別スレッドから立てる/下ろすだけなので、ロックなしの読み取りで十分。
+    wait() は通常の Event と同じ。
+    """
+    def __init__(self) -> None:
+        super().__init__()
+        self.view: List[bool] = [False]
+
+    def is_set(self) -> bool:
+        return self._flag  # type: ignore[attr-defined]
+
+    def set(self) -> None:
+        self.view[0] = True
+        super().set()
+
+    def clear(self) -> None:
+        super().clear()
+        self.view[0] = False
+
+
 class HoldState:
     """
     停止時に「押しっぱなし」を必ず解放するための状態。
-    token 例:
-      - "key:a"
-      - "key:Key.ctrl_l"
-      - "mouse:left"
+    押しっぱなしになり得るキー/ボタンはコンパイル時に register() で番号を振り、
+    解放手段を表に持っておく（停止時に文字列の解析や変換をしない）。
+      - SendInput 経路: 離す INPUT を用意しておき、停止時は押下中の分をまとめて 1 回で送る
+      - それ以外: 解放用の関数を呼ぶ
+    押下中かどうかは番号をビット位置とする int で持つ。
+    site 例:
+      - ("key", "a")
+      - ("key", "ctrl")
+      - ("mouse", "left")
     """
     def __init__(self) -> None:
         self._lock = threading.Lock()
-        self._held: set[str] = set()
-
-    def mark_down(self, token: str) -> None:
+        self._held = 0
+        self._ids: Dict[Any, int] = {}
+        self._release_table: List[Optional[Callable[[], None]]] = []
+        self._release_inputs: List[Optional[ctypes.Array]] = []
+        self._release_buffer: Optional[ctypes.Array] = None
+
+    def register(
+        self,
+        site: Any,
+        release: Optional[Callable[[], None]] = None,
+        up_inputs: Optional[List[SI.INPUT]] = None,
+    ) -> int:
+        # 同じキー/ボタンの press と release は同じ番号を共有する
+        i = self._ids.get(site)
+        if i is None:
+            i = len(self._release_table)
+            self._ids[site] = i
+            self._release_table.append(release)
+            self._release_inputs.append(SI.pack(up_inputs) if up_inputs else None)
+            if up_inputs:
+                # 全部押下中でも収まる大きさの送信用バッファを用意しておく
+                total = sum(len(arr) for arr in self._release_inputs if arr is not None)
+                self._release_buffer = (SI.INPUT * total)()
+        return i
+
+    def mark_down(self, i: int) -> None:
         with self._lock:
-            self._held.add(token)
+            self._held |= 1 << i
 
-    def mark_up(self, token: str) -> None:
+    def mark_up(self, i: int) -> None:
         with self._lock:
-            self._held.discard(token)
+            self._held &= ~(1 << i)
 
     def release_all(self) -> None:
+        table = self._release_table
+        inputs = self._release_inputs
+        size = SI.INPUT_SIZE
         with self._lock:
-            tokens = list(self._held)
-            self._held.clear()
-
-        for t in tokens:
-            try:
-                kind, val = t.split(":", 1)
-                if kind == "key":
-                    if USE_PDI:
-                        PDI.keyUp(to_pdi_key(val))  # type: ignore
+            held = self._held
+            self._held = 0
+            n = 0
+            i = 0
+            while held:
+                if held & 1:
+                    arr = inputs[i]
+                    if arr is not None:
+                        # 離す INPUT を送信用バッファに詰める
+                        ctypes.memmove(ctypes.addressof(self._release_buffer) + n * size,  # type: ignore[arg-type]
+                                       arr, len(arr) * size)
+                        n += len(arr)
                     else:
-                        K.release(parse_key_pynput(val))
-                elif kind == "mouse":
-                    if USE_PDI:
-                        PDI.mouseUp(button=to_pdi_button(val))  # type: ignore
-                    else:
-                        btn = Button.left if val == "left" else (Button.right if val == "right" else Button.middle)
-                        M.release(btn)
-            except Exception:
-                pass
+                        try:
+                            table[i]()  # type: ignore[misc]
+                        except Exception:
+                            pass
+                held >>= 1
+                i += 1
+            if n:
+                try:
+                    SI.SendInput(n, self._release_buffer, size)
+                except Exception:
+                    pass
+
+
+Op = Callable[[threading.Event, "HoldState"], None]
 
 
-def do_step(step: Dict[str, Any], stop_event: threading.Event, hold: HoldState) -> None:
+def _noop(ev: threading.Event, h: HoldState) -> None:
+    return None
+
+
+def _fusable(prev: Dict[str, Any], step: Dict[str, Any]) -> bool:
     t = step.get("type")
+    return t == prev.get("type") and t in ("wait", "text")
 
-    if t == "wait":
-        stop_event.wait(timeout=float(step.get("seconds", 0)))
-        return
 
-    if stop_event.is_set():
-        return
+def fuse_steps(steps: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    隣り合う同種の step をまとめる（動作は変わらない）。
+      - text 同士: 文字列を連結
+      - wait 同士: 秒数を合計（wait は停止で即座に抜けるので長くなっても問題ない）
+    mouse_move / mouse_scroll はまとめない（ドラッグの軌跡や画面端での位置が変わるため）。
+    """
+    out: List[Dict[str, Any]] = []
+    for step in steps:
+        prev = out[-1] if out else None
+        if prev is None or not _fusable(prev, step):
+            out.append(step)
+            continue
+
+        t = step["type"]
+        if t == "text":
+            out[-1] = {"type": "text", "text": prev["text"] + step["text"]}
+        else:
+            out[-1] = {"type": "wait", "seconds": prev["seconds"] + step["seconds"]}
+    return out
+
+
+def _send_op(inputs: List[SI.INPUT], mark: Optional[Callable[[int], None]] = None, token: int = -1) -> Op:
+    """コンパイル済みの INPUT 配列を 1 回の SendInput で送る op を作る。"""
+    buf = SI.pack(inputs)
+    n = len(inputs)
+    if mark is None:
+        send = lambda ev, h, buf=buf, n=n, fn=SI.SendInput, size=SI.INPUT_SIZE: fn(n, buf, size)
+        send.record = (OP_SEND, ctypes.addressof(buf), n)  # type: ignore[attr-defined]
+        return send
+
+    def op(ev: threading.Event, h: HoldState, buf=buf, n=n, fn=SI.SendInput, size=SI.INPUT_SIZE,
+           mark=mark, token=token) -> None:
+        fn(n, buf, size)
+        mark(token)
+    return op
+
+
+def _compile_wait(seconds: float, stop_flag: List[bool], stop_handle: Optional[int]) -> Op:
+    if seconds <= 0:
+        return _noop
+
+    if seconds < SPIN_WAIT_SECONDS:
+        # OS のタイマ分解能より短いのでスピンで待つ（停止は毎周チェック）
+        def op(ev: threading.Event, h: HoldState, s=seconds, now=time.perf_counter, flag=stop_flag) -> None:
+            deadline = now() + s
+            while now() < deadline:
+                if flag[0]:
+                    return
+        return op
+
+    if stop_handle is not None:
+        # 停止イベント（Win32）を直接待つ。stop() で SetEvent されると即座に戻る
+        ms = WT.to_wait_ms(seconds)
+        wait = lambda ev, h, hd=stop_handle, ms=ms, fn=WT.WaitForSingleObject: fn(hd, ms)
+        wait.record = (OP_WAIT, ms, 0)  # type: ignore[attr-defined]
+        return wait
+
+    return lambda ev, h, s=seconds: ev.wait(timeout=s)
+
+
+def _tap_op(press: Op, release: Op, wait: Op) -> Op:
+    # wait は停止で即座に抜けるが、離す操作は必ず行う
+    def op(ev: threading.Event, h: HoldState, press=press, release=release, wait=wait) -> None:
+        press(ev, h)
+        try:
+            wait(ev, h)
+        finally:
+            release(ev, h)
+    return op
+
+
+def op_record(op: Op) -> Tuple[int, Any, int]:
+    """op を _macro_runtime 用の命令に変換する（SendInput / wait 以外は Python の op を呼ぶ）。"""
+    return getattr(op, "record", (OP_CALL, op, 0))
+
+
+def compile_step(
+    step: Dict[str, Any],
+    hold: HoldState,
+    stop_flag: List[bool],
+    stop_handle: Optional[int] = None,
+) -> Op:
+    """
+    step(dict) を「引数 (stop_event, hold) だけを取る関数」に変換する。
+    step は normalize_step() 済みであること（型・既定値はそろっている前提）。
+    キー名・ボタン名の解釈はここで1回だけ行い、実行時は呼ぶだけにする。
+    押しっぱなしになり得る step は hold に解放用の関数を登録しておく。
+    stop_flag は停止要求を表す長さ 1 のリスト、stop_handle は停止通知用の Win32 イベント
+    （どちらも wait で使う。stop_handle は Windows 以外では None）。
+    """
+    t = step.get("type")
+
+    if t == "wait":
+        return _compile_wait(step["seconds"], stop_flag, stop_handle)
 
     if t == "text":
-        text = str(step.get("text", ""))
+        text = step["text"]
         if USE_PDI:
-            PDI.write(text, interval=0)  # type: ignore
-        else:
-            K.type(text)
-        return
+            return lambda ev, h, s=text, fn=PDI.write: fn(s, interval=0)  # type: ignore
+        return lambda ev, h, s=text, fn=K.type: fn(s)
 
     if t == "key":
-        raw = str(step["key"])
-        action = str(step.get("action", "tap"))
+        raw = step["key"]
+        action = step["action"]
 
         if USE_PDI:
             k = to_pdi_key(raw)
-            token = f"key:{raw}"
+            sc = SI.scan_code(k) if USE_SENDINPUT else None
+            if sc is not None:
+                scan, flags = sc
+                down = SI.key_input(scan, flags)
+                up = SI.key_input(scan, flags | SI.KEYEVENTF_KEYUP)
+                if action == "tap":
+                    # pydirectinput.press と同じく、押してから PDI.PAUSE 秒後に離す
+                    # （押下時間 0 だとフレーム単位で入力を読むゲームが取りこぼす）
+                    return _tap_op(_send_op([down]), _send_op([up]),
+                                   _compile_wait(PDI.PAUSE, stop_flag, stop_handle))  # type: ignore
+                token = hold.register(("key", k), up_inputs=[up])
+                if action == "press":
+                    return _send_op([down], hold.mark_down, token)
+                if action == "release":
+                    return _send_op([up], hold.mark_up, token)
+                raise ValueError('key.action は "tap"/"press"/"release" のみ')
+
+            # スキャンコードに変換できないキーは pydirectinput に任せる
             if action == "tap":
-                PDI.press(k)  # type: ignore
-                return
+                return lambda ev, h, k=k, fn=PDI.press: fn(k)  # type: ignore
+            token = hold.register(("key", k), partial(PDI.keyUp, k))  # type: ignore
             if action == "press":
-                PDI.keyDown(k)  # type: ignore
-                hold.mark_down(token)
-                return
+                def op(ev: threading.Event, h: HoldState, k=k, fn=PDI.keyDown, token=token) -> None:  # type: ignore
+                    fn(k)
+                    h.mark_down(token)
+                return op
             if action == "release":
-                PDI.keyUp(k)  # type: ignore
-                hold.mark_up(token)
-                return
+                def op(ev: threading.Event, h: HoldState, k=k, fn=PDI.keyUp, token=token) -> None:  # type: ignore
+                    fn(k)
+                    h.mark_up(token)
+                return op
             raise ValueError('key.action は "tap"/"press"/"release" のみ')
 
         # fallback: pynput
         key = parse_key_pynput(raw)
-        token = f"key:{raw}"
         if action == "tap":
-            K.press(key); K.release(key)
-            return
+            def op(ev: threading.Event, h: HoldState, key=key) -> None:
+                K.press(key); K.release(key)
+            return op
+        token = hold.register(("key", key), partial(K.release, key))
         if action == "press":
-            K.press(key); hold.mark_down(token)
-            return
+            def op(ev: threading.Event, h: HoldState, key=key, token=token) -> None:
+                K.press(key); h.mark_down(token)
+            return op
         if action == "release":
-            K.release(key); hold.mark_up(token)
-            return
+            def op(ev: threading.Event, h: HoldState, key=key, token=token) -> None:
+                K.release(key); h.mark_up(token)
+            return op
         raise ValueError('key.action は "tap"/"press"/"release" のみ')
 
     if t == "combo":
-        raw_keys = [str(k) for k in step.get("keys", [])]
+        raw_keys = step["keys"]
         if not raw_keys:
-            return
+            return _noop
 
         if USE_PDI:
-            for rk in raw_keys:
-                PDI.keyDown(to_pdi_key(rk))  # type: ignore
-            for rk in reversed(raw_keys):
-                PDI.keyUp(to_pdi_key(rk))  # type: ignore
-            return
-
-        keys = [parse_key_pynput(rk) for rk in raw_keys]
-        for k in keys:
-            K.press(k)
-        for k in reversed(keys):
-            K.release(k)
-        return
+            pdi_keys = [to_pdi_key(rk) for rk in raw_keys]
+            scs = [SI.scan_code(k) for k in pdi_keys] if USE_SENDINPUT else [None]
+            if None not in scs:
+                # 押す（順番どおり）→ PDI.PAUSE 秒待つ → 離す（逆順）。
+                # 押す/離すはそれぞれ 1 回の SendInput でまとめて送る（同時押しのまま 2 回で済む）
+                downs = [SI.key_input(scan, flags) for scan, flags in scs]
+                ups = [SI.key_input(scan, flags | SI.KEYEVENTF_KEYUP) for scan, flags in reversed(scs)]
+                # 押している間に停止されたら release_all() が離す INPUT をまとめて送る
+                token = hold.register(("combo", tuple(scs)), up_inputs=ups)
+
+                def op(ev: threading.Event, h: HoldState, press=_send_op(downs),
+                       release=_send_op(ups, hold.mark_up, token),
+                       wait=_compile_wait(PDI.PAUSE, stop_flag, stop_handle), token=token) -> None:  # type: ignore
+                    h.mark_down(token)
+                    try:
+                        press(ev, h)
+                        wait(ev, h)
+                    finally:
+                        release(ev, h)
+                return op
+
+            down = tuple(pdi_keys)
+            up = tuple(reversed(down))
+
+            def release(up=up, key_up=PDI.keyUp) -> None:  # type: ignore
+                for k in up:
+                    key_up(k)
+
+            # 1 キーずつ送るので、途中で停止されたときのために combo 全体を押下中として扱う
+            token = hold.register(("combo", down), release)
+
+            def op(ev: threading.Event, h: HoldState, down=down, release=release,
+                   key_down=PDI.keyDown, token=token) -> None:  # type: ignore
+                h.mark_down(token)
+                try:
+                    for k in down:
+                        key_down(k)
+                finally:
+                    # 途中で例外（FailSafeException など）が出ても押したキーは必ず離す。
+                    # 離すのに失敗したら押下中のまま残し、release_all() に任せる
+                    release()
+                    h.mark_up(token)
+            return op
+
+        keys = tuple(parse_key_pynput(rk) for rk in raw_keys)
+        rev = tuple(reversed(keys))
+
+        def release_keys(rev=rev) -> None:
+            for k in rev:
+                K.release(k)
+
+        token = hold.register(("combo", keys), release_keys)
+
+        def op(ev: threading.Event, h: HoldState, keys=keys, release=release_keys, token=token) -> None:
+            h.mark_down(token)
+            try:
+                for k in keys:
+                    K.press(k)
+            finally:
+                release()
+                h.mark_up(token)
+        return op
 
     if t == "mouse_click":
-        button = str(step.get("button", "left"))
-        count = int(step.get("count", 1))
+        button = step["button"]
+        count = step["count"]
+        if USE_SENDINPUT:
+            # 押す/離すを count 回分並べた配列を 1 回の SendInput で送る
+            down_flag, up_flag = SI.MOUSE_BUTTON_FLAGS[to_pdi_button(button)]
+            return _send_op([SI.mouse_input(down_flag), SI.mouse_input(up_flag)] * count)
         if USE_PDI:
-            PDI.click(button=to_pdi_button(button), clicks=max(1, count), interval=0)  # type: ignore
-            return
-        btn = Button.left if button == "left" else (Button.right if button == "right" else Button.middle)
-        for _ in range(max(1, count)):
-            M.click(btn)
-        return
+            b = to_pdi_button(button)
+            return lambda ev, h, b=b, n=count, fn=PDI.click: fn(button=b, clicks=n, interval=0)  # type: ignore
+        btn = to_pynput_button(button)
+
+        def op(ev: threading.Event, h: HoldState, btn=btn, n=count) -> None:
+            for _ in range(n):
+                M.click(btn)
+        return op
 
     # ★追加：マウス押しっぱなし
     if t == "mouse_button":
-        button = str(step.get("button", "left"))
-        action = str(step.get("action", "tap"))
-        token = f"mouse:{button}"
+        button = step["button"]
+        action = step["action"]
+
+        if USE_SENDINPUT:
+            b = to_pdi_button(button)
+            down_flag, up_flag = SI.MOUSE_BUTTON_FLAGS[b]
+            down = SI.mouse_input(down_flag)
+            up = SI.mouse_input(up_flag)
+            if action == "tap":
+                return _send_op([down, up])
+            token = hold.register(("mouse", b), up_inputs=[up])
+            if action == "press":
+                return _send_op([down], hold.mark_down, token)
+            if action == "release":
+                return _send_op([up], hold.mark_up, token)
+            raise ValueError('mouse_button.action は "tap"/"press"/"release" のみ')
 
         if USE_PDI:
             b = to_pdi_button(button)
             if action == "tap":
-                PDI.click(button=b, clicks=1, interval=0)  # type: ignore
-                return
+                return lambda ev, h, b=b, fn=PDI.click: fn(button=b, clicks=1, interval=0)  # type: ignore
+            token = hold.register(("mouse", b), partial(PDI.mouseUp, button=b))  # type: ignore
             if action == "press":
-                PDI.mouseDown(button=b)  # type: ignore
-                hold.mark_down(token)
-                return
+                def op(ev: threading.Event, h: HoldState, b=b, fn=PDI.mouseDown, token=token) -> None:  # type: ignore
+                    fn(button=b)
+                    h.mark_down(token)
+                return op
             if action == "release":
-                PDI.mouseUp(button=b)  # type: ignore
-                hold.mark_up(token)
-                return
+                def op(ev: threading.Event, h: HoldState, b=b, fn=PDI.mouseUp, token=token) -> None:  # type: ignore
+                    fn(button=b)
+                    h.mark_up(token)
+                return op
             raise ValueError('mouse_button.action は "tap"/"press"/"release" のみ')
 
         # fallback
-        btn = Button.left if button == "left" else (Button.right if button == "right" else Button.middle)
+        btn = to_pynput_button(button)
         if action == "tap":
-            M.click(btn); return
+            return lambda ev, h, btn=btn: M.click(btn)
+        token = hold.register(("mouse", btn), partial(M.release, btn))
         if action == "press":
-            M.press(btn); hold.mark_down(token); return
+            def op(ev: threading.Event, h: HoldState, btn=btn, token=token) -> None:
+                M.press(btn); h.mark_down(token)
+            return op
         if action == "release":
-            M.release(btn); hold.mark_up(token); return
+            def op(ev: threading.Event, h: HoldState, btn=btn, token=token) -> None:
+                M.release(btn); h.mark_up(token)
+            return op
         raise ValueError('mouse_button.action は "tap"/"press"/"release" のみ')
 
     if t == "mouse_move":
-        mode = str(step.get("mode", "relative"))
-        x = int(step.get("x", 0))
-        y = int(step.get("y", 0))
+        mode = step["mode"]
+        x = step["x"]
+        y = step["y"]
         if USE_PDI:
             if mode == "relative":
-                PDI.moveRel(x, y)  # type: ignore
-                return
+                return lambda ev, h, x=x, y=y, fn=PDI.moveRel: fn(x, y)  # type: ignore
             if mode == "absolute":
-                PDI.moveTo(x, y)  # type: ignore
-                return
+                return lambda ev, h, x=x, y=y, fn=PDI.moveTo: fn(x, y)  # type: ignore
             raise ValueError('mouse_move.mode は "relative"/"absolute" のみ')
         if mode == "relative":
-            M.move(x, y); return
+            return lambda ev, h, x=x, y=y: M.move(x, y)
         if mode == "absolute":
-            M.position = (x, y); return
+            def op(ev: threading.Event, h: HoldState, pos=(x, y)) -> None:
+                M.position = pos
+            return op
         raise ValueError('mouse_move.mode は "relative"/"absolute" のみ')
 
     if t == "mouse_scroll":
-        dx = int(step.get("dx", 0))
-        dy = int(step.get("dy", 0))
+        dx = step["dx"]
+        dy = step["dy"]
         if USE_PDI:
             # pydirectinput は縦スクロール中心
-            if dy != 0:
-                PDI.scroll(dy)  # type: ignore
-            return
-        M.scroll(dx, dy)
-        return
+            if dy == 0:
+                return _noop
+            return lambda ev, h, dy=dy, fn=PDI.scroll: fn(dy)  # type: ignore
+        return lambda ev, h, dx=dx, dy=dy: M.scroll(dx, dy)
 
     raise ValueError(f"不明な step.type: {t}")
 
 
+def _config_key(config: Dict[str, Any], name: str) -> Optional[KeyLike]:
+    # load_config() 経由なら変換済みの値がある
+    if f"_{name}" in config:
+        return config[f"_{name}"]
+    return parse_key_pynput(str(config[name])) if config.get(name) else None
+
+
 class MacroTool:
     def __init__(self, config: Dict[str, Any]) -> None:
         self.trigger_hotkey: Optional[str] = (
@@ -297,24 +728,47 @@ class MacroTool:
             str(config.get("quit_hotkey")).strip() if config.get("quit_hotkey") else None
         )
 
-        self.trigger_key: Optional[KeyLike] = (
-            parse_key_pynput(str(config["trigger_key"])) if config.get("trigger_key") else None
-        )
-        self.quit_key: Optional[KeyLike] = (
-            parse_key_pynput(str(config["quit_key"])) if config.get("quit_key") else None
-        )
+        self.trigger_key: Optional[KeyLike] = _config_key(config, "trigger_key")
+        self.quit_key: Optional[KeyLike] = _config_key(config, "quit_key")
 
         self.loop: bool = bool(config.get("loop", False))
         self.macro: List[Dict[str, Any]] = list(config.get("macro", []))
 
-        self.stop_event = threading.Event()
+        self.stop_event = FastEvent()
+        # 実行ループからの停止チェック用（stop_event と連動する長さ 1 のリスト）
+        self._stop_view: List[bool] = self.stop_event.view
+        self._stop_handle: Optional[int] = WT.create_stop_event()
         self.thread: Optional[threading.Thread] = None
         self.lock = threading.Lock()
 
-        self._down: set[str] = set()
-        self._hotkeys: Optional[keyboard.GlobalHotKeys] = None
+        # 単キー監視用。key_id() 形式のタプルで比較する
+        self._trigger_id: Optional[Tuple[int, Any]] = (
+            key_id(self.trigger_key) if self.trigger_key is not None else None
+        )
+        self._quit_id: Optional[Tuple[int, Any]] = key_id(self.quit_key) if self.quit_key is not None else None
+        self._down: set[Tuple[int, Any]] = set()
+        self._hotkeys: Optional[Union[keyboard.Listener, HK.HotKeyLoop]] = None
+
+        # pynput でホットキーを監視する場合の判定用。
+        # ホットキーに出てくるキーごとにビットを割り当て、押下中のキーを int のビットで持つ
+        self._hotkey_bits: Dict[Tuple[int, Any], int] = {}
+        self._hotkey_masks: List[Tuple[int, Callable[[], None]]] = []
+        self._down_mask = 0
+        for hotkey, cb in self._hotkey_mapping().items():
+            mask = 0
+            for kid in parse_hotkey_ids(hotkey):
+                bit = self._hotkey_bits.setdefault(kid, 1 << len(self._hotkey_bits))
+                mask |= bit
+            self._hotkey_masks.append((mask, cb))
 
         self._hold = HoldState()
+        self._ops: List[Op] = self._compile()
+        self._records: List[Tuple[int, Any, int]] = [op_record(op) for op in self._ops]
+
+    def _compile(self) -> List[Op]:
+        # load_config() を通していない設定でも動くよう、ここでも正規化する（正規化済みなら同じ結果）
+        steps = fuse_steps([normalize_step(i, step) for i, step in enumerate(self.macro)])
+        return [compile_step(step, self._hold, self._stop_view, self._stop_handle) for step in steps]
 
     def is_running(self) -> bool:
         return self.thread is not None and self.thread.is_alive()
@@ -324,12 +778,16 @@ class MacroTool:
             if self.is_running():
                 return
             self.stop_event.clear()
+            if self._stop_handle is not None:
+                WT.ResetEvent(self._stop_handle)
             self.thread = threading.Thread(target=self._run, daemon=True)
             self.thread.start()
             print(f"[macro] started (USE_PDI={USE_PDI})")
 
     def stop(self) -> None:
         self.stop_event.set()
+        if self._stop_handle is not None:
+            WT.SetEvent(self._stop_handle)
         # 停止した瞬間に押しっぱなしを必ず解放
         self._hold.release_all()
 
@@ -350,61 +808,96 @@ class MacroTool:
             self._hotkeys.stop()
 
     def _run(self) -> None:
+        ops = self._ops
+        stop = self.stop_event
+        flag = self._stop_view
+        hold = self._hold
         try:
-            if self.loop:
-                while not self.stop_event.is_set():
-                    for step in self.macro:
-                        if self.stop_event.is_set():
-                            break
-                        do_step(step, self.stop_event, self._hold)
-            else:
-                for step in self.macro:
-                    if self.stop_event.is_set():
+            if RT is not None and self._stop_handle is not None:
+                RT.run(self._records, self.loop, flag, self._stop_handle, stop, hold)
+                return
+            while True:
+                for op in ops:
+                    if flag[0]:
                         break
-                    do_step(step, self.stop_event, self._hold)
+                    op(stop, hold)
+                if not self.loop or flag[0]:
+                    break
         finally:
             self._hold.release_all()
             print("[macro] stopped")
 
     # --- 単キー監視（必要な人向け） ---
-    def _key_id(self, k: KeyLike) -> str:
-        if isinstance(k, Key):
-            return f"Key.{k.name}"
-        if isinstance(k, KeyCode):
-            return f"Char.{k.char}"
-        return str(k)
-
     def _on_press_single(self, k: KeyLike) -> Optional[bool]:
-        kid = self._key_id(k)
+        kid = key_id(k)
         if kid in self._down:
             return None
         self._down.add(kid)
 
-        if self.trigger_key is not None and key_matches(k, self.trigger_key):
+        if kid == self._trigger_id:
             self.toggle()
             return None
 
-        if self.quit_key is not None and key_matches(k, self.quit_key):
+        if kid == self._quit_id:
             self.request_quit()
             return False
 
         return None
 
     def _on_release_single(self, k: KeyLike) -> None:
-        self._down.discard(self._key_id(k))
+        self._down.discard(key_id(k))
+
+    def _hotkey_mapping(self) -> Dict[str, Callable[[], None]]:
+        if not self.trigger_hotkey:
+            return {}
+        mapping = {self.trigger_hotkey: self.toggle}
+        if self.quit_hotkey:
+            mapping[self.quit_hotkey] = self.request_quit
+        return mapping
+
+    # --- ホットキー監視（pynput 版。RegisterHotKey が使えないとき） ---
+    def _on_press_hotkey(self, k: KeyLike, injected: bool = False) -> None:
+        # マクロ自身が送った入力（SendInput / pydirectinput）はホットキー判定に含めない
+        if injected:
+            return
+        bit = self._hotkey_bits.get(key_id(self._hotkeys.canonical(k)))  # type: ignore[union-attr]
+        if bit is None or self._down_mask & bit:
+            return
+        down = self._down_mask = self._down_mask | bit
+        for mask, cb in self._hotkey_masks:
+            # 今押したキーで、そのホットキーのキーが全部そろったときだけ発火
+            if mask & bit and not mask & ~down:
+                cb()
+
+    def _on_release_hotkey(self, k: KeyLike, injected: bool = False) -> None:
+        if injected:
+            return
+        bit = self._hotkey_bits.get(key_id(self._hotkeys.canonical(k)))  # type: ignore[union-attr]
+        if bit is not None:
+            self._down_mask &= ~bit
 
     def run_forever(self) -> None:
         if self.trigger_hotkey:
-            mapping = {self.trigger_hotkey: self.toggle}
-            if self.quit_hotkey:
-                mapping[self.quit_hotkey] = self.request_quit
+            mapping = self._hotkey_mapping()
 
             print(f"[macro] trigger_hotkey={self.trigger_hotkey} / quit_hotkey={self.quit_hotkey}")
-            print(f"[macro] listening (GlobalHotKeys) / USE_PDI={USE_PDI}")
 
-            with keyboard.GlobalHotKeys(mapping) as h:
-                self._hotkeys = h
-                h.join()
+            # Windows では OS 側で判定する RegisterHotKey を優先する
+            if HK.AVAILABLE:
+                loop = HK.HotKeyLoop()
+                if loop.register_all(list(mapping.items())):
+                    print(f"[macro] listening (RegisterHotKey) / USE_PDI={USE_PDI}")
+                    self._hotkeys = loop
+                    loop.run()
+                    return
+                print("[macro] RegisterHotKey に失敗したため pynput で監視します")
+
+            print(f"[macro] listening (hotkey) / USE_PDI={USE_PDI}")
+
+            listener = keyboard.Listener(on_press=self._on_press_hotkey, on_release=self._on_release_hotkey)
+            self._hotkeys = listener
+            with listener:
+                listener.join()
             return
 
         if self.trigger_key is None:
@@ -419,7 +912,13 @@ class MacroTool:
 
 def main() -> None:
     config = load_config()
-    MacroTool(config).run_forever()
+    tool = MacroTool(config)
+    # 短い wait を正確にするため、常駐中はタイマ分解能を 1ms にする
+    WT.begin_period()
+    try:
+        tool.run_forever()
+    finally:
+        WT.end_period()
 
 
 if __name__ == "__main__":